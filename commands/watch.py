@@ -0,0 +1,290 @@
+import asyncio
+from collections import deque
+
+from utils.exceptions import ConnectionError, OperationFailure
+
+# Server error codes after which a change stream can be resumed.
+_RESUMABLE_ERROR_CODES = frozenset([
+    6,      # HostUnreachable
+    7,      # HostNotFound
+    43,     # CursorNotFound
+    63,     # StaleShardVersion
+    89,     # NetworkTimeout
+    91,     # ShutdownInProgress
+    133,    # FailedToSatisfyReadPreference
+    150,    # StaleEpoch
+    189,    # PrimarySteppedDown
+    234,    # RetryChangeStream
+    262,    # ExceededTimeLimit
+    9001,   # SocketException
+    10107,  # NotWritablePrimary
+    11600,  # InterruptedAtShutdown
+    11602,  # InterruptedDueToReplStateChange
+    13388,  # StaleConfig
+    13435,  # NotPrimaryNoSecondaryOk
+    13436,  # NotPrimaryOrSecondary
+])
+
+_NETWORK_ERRORS = (ConnectionError, OSError, EOFError, asyncio.TimeoutError)
+
+# Delay before the first resume attempt, grown linearly with each further attempt.
+_RESUME_BACKOFF_SECONDS = 0.1
+
+
+class ChangeStream:
+    """
+    Async iterator over a `$changeStream` aggregation.
+
+    The cursor is opened lazily on first use and advanced with `getMore`,
+    which blocks on the server for up to `max_await_time_ms` when no events
+    are available. Events can be consumed one at a time with `async for`,
+    or a server batch at a time with `batches()`.
+
+    The resume token is tracked from each event's `_id` and from the
+    `postBatchResumeToken` of every batch, so that after a network error or
+    a resumable server error the stream reconnects and continues from the
+    last position it reported.
+
+    The stream owns its client: it connects it on first use, reconnects it
+    on errors and closes it in `close()`. A client has a single socket, so
+    it must not be shared with other operations; `watch()` creates a
+    dedicated one.
+    """
+
+    def __init__(self, client, pipeline=None, database=None, collection=None,
+                 full_document=None, resume_after=None, start_after=None,
+                 max_await_time_ms=1000, batch_size=None, max_resume_attempts=3):
+        """
+        :param client: MongoClient instance used by this stream only.
+        :param pipeline: Additional aggregation stages applied after `$changeStream`.
+        :param database: Database to watch. Watches the whole cluster when omitted.
+        :param collection: Collection to watch. Watches the whole database when omitted.
+        :param full_document: `fullDocument` mode, e.g. "updateLookup", "whenAvailable" or "required".
+        :param resume_after: Resume token to start the stream after.
+        :param start_after: Resume token to start the stream after, allowed past invalidate events.
+        :param max_await_time_ms: How long each `getMore` waits for new events.
+        :param batch_size: Maximum number of events per server batch.
+        :param max_resume_attempts: Consecutive resume attempts before the error is raised.
+        """
+        if collection and not database:
+            raise ValueError("A database is required to watch a collection.")
+
+        self.client = client
+        self.pipeline = list(pipeline or [])
+        self.database = database
+        self.collection = collection
+        self.full_document = full_document
+        self.max_await_time_ms = max_await_time_ms
+        self.batch_size = batch_size
+        self.max_resume_attempts = max_resume_attempts
+
+        self._start_after = start_after
+        self._resume_token = resume_after
+        self._cursor_id = None
+        self._cursor_collection = None
+        self._post_batch_resume_token = None
+        self._buffer = deque()
+        self._started = False
+        self._closed = False
+
+    @property
+    def resume_token(self):
+        """The token from which the stream would currently resume."""
+        return self._resume_token
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._buffer:
+            if self._closed:
+                raise StopAsyncIteration
+            self._buffer = deque(await self._next_server_batch())
+
+        event = self._buffer.popleft()
+        if self._buffer or self._post_batch_resume_token is None:
+            self._resume_token = self._event_token(event)
+        else:
+            self._resume_token = self._post_batch_resume_token
+        return event
+
+    async def batches(self):
+        """
+        Yields each non-empty server batch as a list of events.
+        """
+        while not self._closed:
+            if self._buffer:
+                batch, self._buffer = list(self._buffer), deque()
+            else:
+                batch = await self._next_server_batch()
+
+            if not batch:
+                continue
+
+            if self._post_batch_resume_token is not None:
+                self._resume_token = self._post_batch_resume_token
+            else:
+                self._resume_token = self._event_token(batch[-1])
+            yield batch
+
+    async def close(self):
+        """
+        Kills the server cursor, stops iteration and closes the stream's client.
+        """
+        self._closed = True
+        self._buffer = deque()
+        await self._kill_cursor()
+        await self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _next_server_batch(self):
+        """
+        Runs a single aggregate or getMore round trip, resuming on transient errors.
+        Errors from the initial aggregate are raised, since there is no position to resume from.
+        """
+        attempts = 0
+        reconnect = False
+        while True:
+            try:
+                if reconnect:
+                    await self._reconnect()
+                    reconnect = False
+                if self._cursor_id is None:
+                    batch = await self._open()
+                else:
+                    batch = await self._get_more()
+                return batch
+            except _NETWORK_ERRORS:
+                attempts += 1
+                if not self._started or attempts > self.max_resume_attempts:
+                    raise
+                reconnect = True
+            except OperationFailure as e:
+                attempts += 1
+                if (not self._started or not self._is_resumable(e)
+                        or attempts > self.max_resume_attempts):
+                    raise
+                await self._kill_cursor()
+            await asyncio.sleep(_RESUME_BACKOFF_SECONDS * attempts)
+
+    async def _open(self):
+        if self.client.connection is None:
+            await self.client.connect()
+
+        change_stream = {}
+        if self.full_document:
+            change_stream["fullDocument"] = self.full_document
+        if self._resume_token is not None:
+            change_stream["resumeAfter"] = self._resume_token
+        elif self._start_after is not None:
+            change_stream["startAfter"] = self._start_after
+        if self.database is None:
+            change_stream["allChangesForCluster"] = True
+
+        cursor_options = {}
+        if self.batch_size is not None:
+            cursor_options["batchSize"] = self.batch_size
+
+        command = {
+            "aggregate": self.collection or 1,
+            "pipeline": [{"$changeStream": change_stream}] + self.pipeline,
+            "cursor": cursor_options,
+            "$db": self._target_database(),
+        }
+        cursor = self._check_response(await self.client.command(command))["cursor"]
+
+        self._cursor_id = cursor["id"]
+        self._cursor_collection = cursor["ns"].split(".", 1)[1]
+        self._started = True
+        return self._read_batch(cursor, "firstBatch")
+
+    async def _get_more(self):
+        command = {
+            "getMore": self._cursor_id,
+            "collection": self._cursor_collection,
+            "maxTimeMS": self.max_await_time_ms,
+            "$db": self._target_database(),
+        }
+        if self.batch_size is not None:
+            command["batchSize"] = self.batch_size
+        cursor = self._check_response(await self.client.command(command))["cursor"]
+
+        self._cursor_id = cursor["id"]
+        return self._read_batch(cursor, "nextBatch")
+
+    def _read_batch(self, cursor, field):
+        self._post_batch_resume_token = cursor.get("postBatchResumeToken")
+        batch = cursor.get(field, [])
+        if not batch and self._post_batch_resume_token is not None:
+            # An empty batch still advances the stream position.
+            self._resume_token = self._post_batch_resume_token
+        if not self._cursor_id:
+            # The server closed the cursor, e.g. after an invalidate event.
+            self._closed = True
+        return batch
+
+    async def _reconnect(self):
+        self._buffer = deque()
+        await self.client.close()
+        await self.client.connect()
+        # The old cursor may have survived the dropped connection.
+        await self._kill_cursor()
+
+    async def _kill_cursor(self):
+        if not self._cursor_id:
+            return
+        cursor_id, self._cursor_id = self._cursor_id, None
+        try:
+            await self.client.command({
+                "killCursors": self._cursor_collection,
+                "cursors": [cursor_id],
+                "$db": self._target_database(),
+            })
+        except _NETWORK_ERRORS:
+            pass
+
+    def _target_database(self):
+        return self.database or "admin"
+
+    @staticmethod
+    def _check_response(response):
+        if not response.get("ok"):
+            raise OperationFailure(
+                response.get("errmsg", "Unknown error"),
+                response.get("code"),
+                response.get("errorLabels"),
+            )
+        return response
+
+    @staticmethod
+    def _is_resumable(error):
+        return (
+            "ResumableChangeStreamError" in error.error_labels
+            or error.code in _RESUMABLE_ERROR_CODES
+        )
+
+    @staticmethod
+    def _event_token(event):
+        if "_id" not in event:
+            raise ValueError("Change event is missing its resume token (_id).")
+        return event["_id"]
+
+
+def watch(client, pipeline=None, database=None, collection=None, **options):
+    """
+    Opens a change stream on the cluster, a database, or a collection.
+    The stream runs on its own client for the same URI, so `client` stays
+    free for other commands and is never reconnected by the stream.
+    :param client: MongoClient instance whose URI the stream connects to.
+    :param pipeline: Additional aggregation stages applied after `$changeStream`.
+    :param database: Database to watch. Watches the whole cluster when omitted.
+    :param collection: Collection to watch. Watches the whole database when omitted.
+    :param options: Further ChangeStream options (full_document, resume_after, ...).
+    """
+    return ChangeStream(type(client)(uri=client.uri), pipeline,
+                        database=database, collection=collection, **options)
@@ -1,6 +1,7 @@
 from src.connection.protocol import send_command
 from src.custom_bson.encoder import encode
 from src.custom_bson.decoder import decode
+from commands.watch import watch
 
 # client.py
 import platform
@@ -182,6 +183,13 @@ class MongoClient:
         print(f"Decoded response: {decoded}")
         return decoded
 
+    def watch(self, pipeline=None, database=None, collection=None, **options):
+        """
+        Open a change stream on the cluster, or on a database or collection when given.
+        The stream uses its own connection to this client's URI, so this client is not affected.
+        """
+        return watch(self, pipeline, database=database, collection=collection, **options)
+
     async def close(self):
         if self.connection:
             await self.connection.close()
@@ -1,6 +1,8 @@
 import asyncio
 import struct
 
+from utils.exceptions import ConnectionError
+
 async def send_command(connection, bson_command):
     try:
         if asyncio.iscoroutine(bson_command):
@@ -43,7 +45,7 @@ async def send_command(connection, bson_command):
         print(f"Received response header length: {len(response_header)}")
         
         if len(response_header) < 16:
-            raise ValueError(f"Incomplete response header. Received {len(response_header)} bytes")
+            raise ConnectionError(f"Incomplete response header. Received {len(response_header)} bytes")
 
         # Parse response header
         resp_length, resp_req_id, resp_to, resp_code = struct.unpack("<iiii", response_header)
@@ -62,7 +64,7 @@ async def send_command(connection, bson_command):
             print(f"Received chunk of {len(chunk)} bytes")
 
         if len(response_body) < remaining_length:
-            raise ValueError(f"Incomplete response body. Expected {remaining_length} bytes, got {len(response_body)}")
+            raise ConnectionError(f"Incomplete response body. Expected {remaining_length} bytes, got {len(response_body)}")
 
         print(f"Full response received: {len(response_header + response_body)} bytes")
         return response_header + response_body
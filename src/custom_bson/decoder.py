@@ -1,7 +1,7 @@
 # decoder.py
 import struct
 from datetime import datetime, timezone
-from .types import ObjectId
+from .types import Binary, ObjectId, Timestamp
 
 async def decode(data):
     """
@@ -67,6 +67,13 @@ async def decode_element(data):
         length = struct.unpack("<i", data[:4])[0]
         value = await decode_document(data[:length])
         return {key: list(value.values())}, data[length:]
+    elif element_type == 0x05:  # Binary
+        length = struct.unpack("<i", data[:4])[0]
+        value = Binary(data[5:5 + length], data[4])  # Payload follows length and subtype byte
+        return {key: value}, data[5 + length:]
+    elif element_type == 0x11:  # Timestamp
+        inc, time = struct.unpack("<II", data[:8])
+        return {key: Timestamp(time, inc)}, data[8:]
     elif element_type == 0x07:  # ObjectId
         value = ObjectId(data[:12])
         return {key: value}, data[12:]
@@ -1,5 +1,5 @@
 import struct
-from .types import ObjectId
+from .types import Binary, ObjectId, Timestamp
 
 async def encode(document):
     """
@@ -28,6 +28,8 @@ async def encode_element(key, value):
     if isinstance(value, str):
         value_bytes = await encode_string(value)
         return b"\x02" + key_bytes + value_bytes
+    elif isinstance(value, bool):
+        return b"\x08" + key_bytes + (b"\x01" if value else b"\x00")  # BSON boolean
     elif isinstance(value, int):
         if -(2**31) <= value <= (2**31) - 1:
             value_bytes = struct.pack("<i", value)
@@ -47,6 +49,12 @@ async def encode_element(key, value):
     elif isinstance(value, ObjectId):
         value_bytes = bytes(value)
         return b"\x07" + key_bytes + value_bytes
+    elif isinstance(value, Binary):
+        value_bytes = struct.pack("<iB", len(value.data), value.subtype) + value.data
+        return b"\x05" + key_bytes + value_bytes  # BSON binary
+    elif isinstance(value, Timestamp):
+        value_bytes = struct.pack("<II", value.inc, value.time)
+        return b"\x11" + key_bytes + value_bytes  # BSON timestamp
     elif value is None:
         return b"\x0A" + key_bytes  # BSON null
     else:
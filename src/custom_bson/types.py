@@ -33,3 +33,58 @@ class ObjectId:
 
     def __repr__(self):
         return f"ObjectId({self.oid.hex()})"
+
+
+class Timestamp:
+    """
+    Custom implementation of the BSON Timestamp type.
+    Consists of:
+      - 4-byte seconds since the Unix epoch
+      - 4-byte ordinal incremented for operations within the same second
+    """
+
+    def __init__(self, time, inc):
+        self.time = time
+        self.inc = inc
+
+    def __eq__(self, other):
+        if not isinstance(other, Timestamp):
+            return NotImplemented
+        return (self.time, self.inc) == (other.time, other.inc)
+
+    def __hash__(self):
+        return hash((self.time, self.inc))
+
+    def __repr__(self):
+        return f"Timestamp({self.time}, {self.inc})"
+
+
+class Binary:
+    """
+    Custom implementation of the BSON Binary type.
+    Consists of:
+      - 1-byte subtype
+      - the raw binary payload
+    """
+
+    def __init__(self, data, subtype=0):
+        if not isinstance(data, bytes):
+            raise ValueError("Binary data must be a bytes value.")
+        if not 0 <= subtype <= 0xFF:
+            raise ValueError("Binary subtype must fit in a single byte.")
+        self.data = data
+        self.subtype = subtype
+
+    def __bytes__(self):
+        return self.data
+
+    def __eq__(self, other):
+        if not isinstance(other, Binary):
+            return NotImplemented
+        return (self.data, self.subtype) == (other.data, other.subtype)
+
+    def __hash__(self):
+        return hash((self.data, self.subtype))
+
+    def __repr__(self):
+        return f"Binary({self.data!r}, {self.subtype})"
@@ -0,0 +1,48 @@
+import asyncio
+import struct
+
+from src.custom_bson.decoder import decode
+from src.custom_bson.encoder import encode
+from src.custom_bson.types import Binary, Timestamp
+
+
+def _roundtrip(document):
+    return asyncio.run(decode(asyncio.run(encode(document))))
+
+
+def test_bool_encodes_as_bson_boolean():
+    encoded = asyncio.run(encode({"a": True, "b": False}))
+    assert encoded[4:8] == b"\x08a\x00\x01"
+    assert encoded[8:12] == b"\x08b\x00\x00"
+    assert _roundtrip({"a": True, "b": False}) == {"a": True, "b": False}
+
+
+def test_int_still_encodes_as_int32():
+    encoded = asyncio.run(encode({"n": 1}))
+    assert encoded[4:7] == b"\x10n\x00"
+    assert _roundtrip({"n": 1}) == {"n": 1}
+
+
+def test_timestamp_decoding():
+    element = b"\x11t\x00" + struct.pack("<II", 7, 1700000000)
+    data = struct.pack("<i", len(element) + 5) + element + b"\x00"
+    assert asyncio.run(decode(data)) == {"t": Timestamp(1700000000, 7)}
+
+
+def test_timestamp_roundtrip():
+    assert _roundtrip({"t": Timestamp(1700000000, 7)}) == {"t": Timestamp(1700000000, 7)}
+
+
+def test_timestamp_is_hashable():
+    assert len({Timestamp(1, 2), Timestamp(1, 2), Timestamp(1, 3)}) == 2
+
+
+def test_binary_decoding_keeps_subtype():
+    element = b"\x05b\x00" + struct.pack("<iB", 3, 4) + b"abc"
+    data = struct.pack("<i", len(element) + 5) + element + b"\x00"
+    assert asyncio.run(decode(data)) == {"b": Binary(b"abc", 4)}
+
+
+def test_binary_roundtrip():
+    token = {"_data": Binary(b"\x82\x00\x01", 0)}
+    assert _roundtrip({"resumeAfter": token}) == {"resumeAfter": token}
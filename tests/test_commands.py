@@ -0,0 +1,261 @@
+import asyncio
+
+import pytest
+
+import commands.watch
+from commands.watch import ChangeStream, watch
+from utils.exceptions import ConnectionError, OperationFailure
+
+CURSOR_ID = 2**40
+
+
+class StubClient:
+    """Replays a scripted list of replies (or exceptions) for each command."""
+
+    def __init__(self, replies=(), connect_errors=(), uri="mongodb://stub/", connected=True):
+        self.uri = uri
+        self.connection = object() if connected else None
+        self.replies = list(replies)
+        self.connect_errors = list(connect_errors)
+        self.commands = []
+        self.connects = 0
+
+    async def command(self, command):
+        self.commands.append(dict(command))
+        if "killCursors" in command:
+            return {"ok": 1.0}
+        reply = self.replies.pop(0)
+        if isinstance(reply, BaseException):
+            raise reply
+        return reply
+
+    async def close(self):
+        self.connection = None
+
+    async def connect(self):
+        self.connects += 1
+        if self.connect_errors:
+            raise self.connect_errors.pop(0)
+        self.connection = object()
+
+    def sent(self, name):
+        return [command for command in self.commands if name in command]
+
+
+def _first_batch(events, token, cursor_id=CURSOR_ID):
+    return {"ok": 1.0, "cursor": {
+        "id": cursor_id, "ns": "db.coll", "firstBatch": events,
+        "postBatchResumeToken": {"_data": token},
+    }}
+
+
+def _next_batch(events, token, cursor_id=CURSOR_ID):
+    return {"ok": 1.0, "cursor": {
+        "id": cursor_id, "nextBatch": events,
+        "postBatchResumeToken": {"_data": token},
+    }}
+
+
+def _event(token):
+    return {"_id": {"_data": token}, "operationType": "insert"}
+
+
+async def _collect(stream, count):
+    events = []
+    async for event in stream:
+        events.append(event)
+        if len(events) == count:
+            break
+    return events
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(commands.watch, "_RESUME_BACKOFF_SECONDS", 0)
+
+
+def test_resume_after_connection_error_uses_post_batch_resume_token():
+    client = StubClient([
+        _first_batch([_event("e1")], "pbrt1"),
+        ConnectionError("Incomplete response header. Received 0 bytes"),
+        _first_batch([_event("e2")], "pbrt2"),
+    ])
+    stream = ChangeStream(client, database="db", collection="coll", full_document="updateLookup")
+
+    events = asyncio.run(_collect(stream, 2))
+
+    assert [event["_id"]["_data"] for event in events] == ["e1", "e2"]
+    aggregates = client.sent("aggregate")
+    assert len(aggregates) == 2
+    assert aggregates[1]["pipeline"][0]["$changeStream"] == {
+        "fullDocument": "updateLookup",
+        "resumeAfter": {"_data": "pbrt1"},
+    }
+    assert client.sent("killCursors")[0]["cursors"] == [CURSOR_ID]
+    assert stream.resume_token == {"_data": "pbrt2"}
+
+
+def test_failed_reconnect_uses_an_attempt_and_retries():
+    client = StubClient(
+        [
+            _first_batch([], "pbrt1"),
+            ConnectionError("Incomplete response header. Received 0 bytes"),
+            _first_batch([_event("e1")], "pbrt2"),
+        ],
+        connect_errors=[OSError("Connection refused")],
+    )
+    stream = ChangeStream(client, database="db", collection="coll")
+
+    events = asyncio.run(_collect(stream, 1))
+
+    assert [event["_id"]["_data"] for event in events] == ["e1"]
+    assert client.connects == 2
+
+
+def test_resume_gives_up_after_max_attempts():
+    client = StubClient(
+        [_first_batch([], "pbrt1"), ConnectionError("Incomplete response header. Received 0 bytes")],
+        connect_errors=[OSError("Connection refused")] * 3,
+    )
+    stream = ChangeStream(client, database="db", collection="coll", max_resume_attempts=2)
+
+    with pytest.raises(OSError):
+        asyncio.run(_collect(stream, 1))
+    assert client.connects == 2
+
+
+def test_resumable_error_label_kills_cursor_and_reopens():
+    client = StubClient([
+        _first_batch([], "pbrt1"),
+        {"ok": 0.0, "code": 280, "errmsg": "retry", "errorLabels": ["ResumableChangeStreamError"]},
+        _first_batch([_event("e1")], "pbrt2"),
+    ])
+    stream = ChangeStream(client, database="db", collection="coll")
+
+    events = asyncio.run(_collect(stream, 1))
+
+    assert [event["_id"]["_data"] for event in events] == ["e1"]
+    assert client.sent("killCursors")[0]["cursors"] == [CURSOR_ID]
+    assert client.sent("aggregate")[1]["pipeline"][0]["$changeStream"]["resumeAfter"] == {"_data": "pbrt1"}
+
+
+def test_non_resumable_error_is_raised():
+    client = StubClient([
+        _first_batch([], "pbrt1"),
+        {"ok": 0.0, "code": 286, "errmsg": "history lost"},
+    ])
+    stream = ChangeStream(client, database="db", collection="coll")
+
+    with pytest.raises(OperationFailure) as excinfo:
+        asyncio.run(_collect(stream, 1))
+    assert excinfo.value.code == 286
+
+
+def test_resumable_error_on_first_aggregate_is_raised():
+    client = StubClient([
+        {"ok": 0.0, "code": 189, "errmsg": "stepped down", "errorLabels": ["ResumableChangeStreamError"]},
+    ])
+    stream = ChangeStream(client, database="db", collection="coll")
+
+    with pytest.raises(OperationFailure) as excinfo:
+        asyncio.run(_collect(stream, 1))
+    assert excinfo.value.code == 189
+    assert len(client.sent("aggregate")) == 1
+
+
+def test_network_error_on_first_aggregate_is_raised():
+    client = StubClient([ConnectionError("Incomplete response header. Received 0 bytes")])
+    stream = ChangeStream(client, database="db", collection="coll")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(_collect(stream, 1))
+    assert client.connects == 0
+
+
+def test_empty_get_more_advances_resume_token():
+    client = StubClient([
+        _first_batch([], "pbrt1"),
+        _next_batch([], "pbrt2"),
+    ])
+    stream = ChangeStream(client, database="db", collection="coll")
+
+    async def run():
+        assert await stream._next_server_batch() == []
+        assert stream.resume_token == {"_data": "pbrt1"}
+        assert await stream._next_server_batch() == []
+        assert stream.resume_token == {"_data": "pbrt2"}
+
+    asyncio.run(run())
+    assert client.sent("getMore")[0]["maxTimeMS"] == 1000
+
+
+def test_batches_yields_whole_server_batches():
+    client = StubClient([
+        _first_batch([], "pbrt1"),
+        _next_batch([_event("e1"), _event("e2")], "pbrt2", cursor_id=0),
+    ])
+    stream = ChangeStream(client, database="db", collection="coll")
+
+    async def run():
+        return [batch async for batch in stream.batches()]
+
+    batches = asyncio.run(run())
+    assert [[event["_id"]["_data"] for event in batch] for batch in batches] == [["e1", "e2"]]
+    assert stream.resume_token == {"_data": "pbrt2"}
+
+
+def test_large_batch_is_delivered_in_order():
+    events = [_event(f"e{i}") for i in range(50000)]
+    client = StubClient([_first_batch(events, "pbrt1", cursor_id=0)])
+    stream = ChangeStream(client, database="db", collection="coll")
+
+    received = asyncio.run(_collect(stream, len(events) + 1))
+
+    assert [event["_id"]["_data"] for event in received] == [f"e{i}" for i in range(50000)]
+    assert stream.resume_token == {"_data": "pbrt1"}
+
+
+def test_cursor_id_zero_ends_iteration():
+    client = StubClient([_first_batch([_event("e1")], "pbrt1", cursor_id=0)])
+    stream = ChangeStream(client, database="db", collection="coll")
+
+    events = asyncio.run(_collect(stream, 10))
+
+    assert [event["_id"]["_data"] for event in events] == ["e1"]
+    assert client.sent("getMore") == []
+
+
+def test_cluster_watch_targets_admin():
+    client = StubClient([_first_batch([], "pbrt1", cursor_id=0)])
+    stream = ChangeStream(client)
+
+    asyncio.run(_collect(stream, 1))
+
+    aggregate = client.sent("aggregate")[0]
+    assert aggregate["aggregate"] == 1
+    assert aggregate["$db"] == "admin"
+    assert aggregate["pipeline"][0]["$changeStream"] == {"allChangesForCluster": True}
+
+
+def test_watch_uses_its_own_client():
+    caller = StubClient(uri="mongodb://db.example:27017/app")
+
+    stream = watch(caller, database="app")
+
+    assert stream.client is not caller
+    assert stream.client.uri == caller.uri
+
+
+def test_stream_connects_on_first_use_and_closes_its_client():
+    client = StubClient([_first_batch([_event("e1")], "pbrt1")], connected=False)
+    stream = ChangeStream(client, database="db", collection="coll")
+
+    async def run():
+        events = await _collect(stream, 1)
+        await stream.close()
+        return events
+
+    assert len(asyncio.run(run())) == 1
+    assert client.connects == 1
+    assert client.sent("killCursors")[0]["cursors"] == [CURSOR_ID]
+    assert client.connection is None
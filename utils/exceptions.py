@@ -3,3 +3,11 @@ class MongoWireException(Exception):
 
 class ConnectionError(MongoWireException):
     """Raised when there is a connection issue."""
+
+class OperationFailure(MongoWireException):
+    """Raised when the server returns an error response to a command."""
+
+    def __init__(self, message, code=None, error_labels=None):
+        super().__init__(message)
+        self.code = code
+        self.error_labels = list(error_labels or [])